@@ -1,5 +1,10 @@
 import streamlit as st
 import sqlite3
+import io
+import hashlib
+import hmac
+import os
+import threading
 import pandas as pd
 from datetime import datetime
 
@@ -7,135 +12,216 @@ from datetime import datetime
 # Database helpers
 # ---------------------------
 DB_NAME = "survey_app.db"
-
+RESPONSES_PER_INSERT = 180  # 5 bound values per row, stays under SQLite's 999 variable limit
+PASSWORD_SCHEME = "pbkdf2_sha256"
+PASSWORD_ITERATIONS = 100_000
+
+def hash_password(password, salt=None, iterations=PASSWORD_ITERATIONS):
+    salt = salt or os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"{PASSWORD_SCHEME}${iterations}${salt.hex()}${digest.hex()}"
+
+def verify_password(password, stored):
+    # Malformed stored values (bad field count, iterations or salt) are a failed login, not a crash
+    try:
+        scheme, iterations, salt, _ = stored.split("$")
+        if scheme != PASSWORD_SCHEME:
+            return False
+        expected = hash_password(password, bytes.fromhex(salt), int(iterations))
+    except (ValueError, OverflowError):
+        return False
+    return hmac.compare_digest(expected.encode("utf-8"), stored.encode("utf-8"))
+
+def connect(database, **kwargs):
+    conn = sqlite3.connect(database, check_same_thread=False, **kwargs)
+    # Per-connection settings (not persisted in the database file)
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-16000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+@st.cache_resource
 def get_conn():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
-
+    # One long-lived write connection shared by all sessions and reruns
+    return connect(DB_NAME)
+
+@st.cache_resource
+def get_read_connections():
+    return threading.local()
+
+def get_read_conn():
+    # Read-only connection per thread: with WAL, readers only ever see committed data and
+    # never observe another session's transaction in progress on the write connection.
+    # Not shared across threads, so a long read in one session can't pin another session
+    # to an old snapshot.
+    local = get_read_connections()
+    if not hasattr(local, "conn"):
+        local.conn = connect(f"file:{DB_NAME}?mode=ro", uri=True)
+    return local.conn
+
+@st.cache_resource
+def get_write_lock():
+    # WAL still allows only one writer; serialize writes on the shared connection
+    return threading.Lock()
+
+@st.cache_resource
 def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-
-    # Admin table (simple demo login)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS admins(
-        username TEXT PRIMARY KEY,
-        password TEXT NOT NULL
-    )
-    """)
-
-    # Surveys table
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS surveys(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        description TEXT,
-        created_at TEXT NOT NULL
-    )
-    """)
-
-    # Questions table
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS questions(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        survey_id INTEGER NOT NULL,
-        question_text TEXT NOT NULL,
-        qtype TEXT NOT NULL, -- text, mcq, rating
-        options TEXT,        -- comma-separated for mcq
-        FOREIGN KEY(survey_id) REFERENCES surveys(id)
-    )
-    """)
-
-    # Responses table (1 row = 1 question answered)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS responses(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        survey_id INTEGER NOT NULL,
-        question_id INTEGER NOT NULL,
-        respondent_name TEXT,
-        answer TEXT NOT NULL,
-        submitted_at TEXT NOT NULL,
-        FOREIGN KEY(survey_id) REFERENCES surveys(id),
-        FOREIGN KEY(question_id) REFERENCES questions(id)
-    )
-    """)
-
-    # Insert default admin if not exists
-    cur.execute("SELECT COUNT(*) FROM admins")
-    if cur.fetchone()[0] == 0:
-        cur.execute("INSERT INTO admins(username, password) VALUES(?,?)", ("admin", "admin123"))
-
-    conn.commit()
-    conn.close()
-
+    # Schema setup and migrations run once per process, not on every rerun
+    with get_write_lock(), get_conn() as conn:
+        cur = conn.cursor()
+
+        # WAL lets user reads proceed while an admin write is in progress (persisted in the db file)
+        cur.execute("PRAGMA journal_mode=WAL")
+
+        # Admin table (simple demo login)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS admins(
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL
+        )
+        """)
+
+        # Surveys table
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS surveys(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            created_at TEXT NOT NULL
+        )
+        """)
+
+        # Questions table
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS questions(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            survey_id INTEGER NOT NULL,
+            question_text TEXT NOT NULL,
+            qtype TEXT NOT NULL, -- text, mcq, rating
+            options TEXT,        -- comma-separated for mcq
+            FOREIGN KEY(survey_id) REFERENCES surveys(id)
+        )
+        """)
+
+        # Responses table (1 row = 1 question answered)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS responses(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            survey_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            respondent_name TEXT,
+            answer TEXT NOT NULL,
+            submitted_at TEXT NOT NULL,
+            FOREIGN KEY(survey_id) REFERENCES surveys(id),
+            FOREIGN KEY(question_id) REFERENCES questions(id)
+        )
+        """)
+
+        # Indexes for per-survey lookups (questions list, responses view/analytics)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_questions_survey ON questions(survey_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_responses_survey ON responses(survey_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_responses_qid ON responses(question_id)")
+
+        # Insert default admin if not exists
+        cur.execute("SELECT COUNT(*) FROM admins")
+        if cur.fetchone()[0] == 0:
+            cur.execute("INSERT INTO admins(username, password) VALUES(?,?)", ("admin", hash_password("admin123")))
+
+        # Hash passwords stored in plaintext by older versions of the app
+        # Exact, case-sensitive prefix test (LIKE would treat "_" as a wildcard and ignore case)
+        prefix = PASSWORD_SCHEME + "$"
+        cur.execute("SELECT username, password FROM admins WHERE substr(password, 1, ?) != ?", (len(prefix), prefix))
+        for username, password in cur.fetchall():
+            cur.execute("UPDATE admins SET password=? WHERE username=?", (hash_password(password), username))
+
+def fetch_rows(query, params=()):
+    # Plain dicts (picklable for st.cache_data); no DataFrame needed for selectboxes/forms
+    cur = get_read_conn().cursor()
+    cur.row_factory = sqlite3.Row
+    cur.execute(query, params)
+    return [dict(row) for row in cur.fetchall()]
+
+@st.cache_data(ttl=60)
 def fetch_surveys():
-    conn = get_conn()
-    df = pd.read_sql_query("SELECT * FROM surveys ORDER BY id DESC", conn)
-    conn.close()
-    return df
+    return fetch_rows("SELECT * FROM surveys ORDER BY id DESC")
 
+@st.cache_data(ttl=60)
 def fetch_questions(survey_id: int):
-    conn = get_conn()
-    df = pd.read_sql_query(
-        "SELECT * FROM questions WHERE survey_id=? ORDER BY id ASC",
-        conn,
-        params=(survey_id,)
-    )
-    conn.close()
-    return df
-
-def insert_survey(title, description):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO surveys(title, description, created_at) VALUES(?,?,?)",
-        (title, description, datetime.now().isoformat(timespec="seconds"))
-    )
-    conn.commit()
-    survey_id = cur.lastrowid
-    conn.close()
+    return fetch_rows("SELECT * FROM questions WHERE survey_id=? ORDER BY id ASC", (survey_id,))
+
+def insert_survey(title, description, questions):
+    # Survey and its questions are written in one transaction (atomic, single commit)
+    with get_write_lock(), get_conn() as conn:
+        survey_id = conn.execute(
+            "INSERT INTO surveys(title, description, created_at) VALUES(?,?,?)",
+            (title, description, datetime.now().isoformat(timespec="seconds"))
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO questions(survey_id, question_text, qtype, options) VALUES(?,?,?,?)",
+            [(survey_id, question_text, qtype, options) for question_text, qtype, options in questions]
+        )
+    fetch_surveys.clear()
+    fetch_questions.clear()
     return survey_id
 
-def insert_question(survey_id, question_text, qtype, options):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO questions(survey_id, question_text, qtype, options) VALUES(?,?,?,?)",
-        (survey_id, question_text, qtype, options)
-    )
-    conn.commit()
-    conn.close()
-
-def insert_response(survey_id, question_id, respondent_name, answer):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO responses(survey_id, question_id, respondent_name, answer, submitted_at)
-           VALUES(?,?,?,?,?)""",
-        (survey_id, question_id, respondent_name, str(answer), datetime.now().isoformat(timespec="seconds"))
-    )
-    conn.commit()
-    conn.close()
+def insert_responses(survey_id, respondent_name, items):
+    # One transaction for the whole submission (single commit instead of one per answer)
+    submitted_at = datetime.now().isoformat(timespec="seconds")
+    rows = [(survey_id, qid, respondent_name, str(ans), submitted_at) for qid, ans in items]
+    with get_write_lock(), get_conn() as conn:
+        # Multi-row VALUES: one statement per chunk instead of one per answer
+        for start in range(0, len(rows), RESPONSES_PER_INSERT):
+            chunk = rows[start:start + RESPONSES_PER_INSERT]
+            conn.execute(
+                """INSERT INTO responses(survey_id, question_id, respondent_name, answer, submitted_at)
+                   VALUES """ + ",".join(["(?,?,?,?,?)"] * len(chunk)),
+                [value for row in chunk for value in row]
+            )
+    fetch_survey_analytics.clear()
 
 def admin_login(username, password):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM admins WHERE username=? AND password=?", (username, password))
-    ok = cur.fetchone() is not None
-    conn.close()
-    return ok
+    cur = get_read_conn().cursor()
+    cur.execute("SELECT password FROM admins WHERE username=?", (username,))
+    row = cur.fetchone()
+    return row is not None and verify_password(password, row[0])
+
+RESPONSES_QUERY = """
+    SELECT r.id, r.respondent_name, r.answer, r.submitted_at,
+           q.question_text, q.qtype
+    FROM responses r
+    JOIN questions q ON q.id = r.question_id
+    WHERE r.survey_id=?
+    ORDER BY r.submitted_at DESC
+"""
 
 def fetch_responses(survey_id: int):
-    conn = get_conn()
-    df = pd.read_sql_query("""
-        SELECT r.id, r.respondent_name, r.answer, r.submitted_at,
-               q.question_text, q.qtype
-        FROM responses r
-        JOIN questions q ON q.id = r.question_id
-        WHERE r.survey_id=?
-        ORDER BY r.submitted_at DESC
-    """, conn, params=(survey_id,))
-    conn.close()
-    return df
+    return pd.read_sql_query(RESPONSES_QUERY, get_read_conn(), params=(survey_id,))
+
+@st.cache_data(ttl=30)
+def fetch_survey_analytics(survey_id: int):
+    # One query for the Analytics tab: every question with its answers, counted per distinct
+    # answer for mcq/rating and kept one row per response for every other qtype (shown as a table)
+    return pd.read_sql_query("""
+        SELECT q.id AS question_id, q.question_text, q.qtype,
+               r.respondent_name, r.answer, r.submitted_at, COUNT(r.id) AS c
+        FROM questions q
+        LEFT JOIN responses r ON r.question_id = q.id AND r.survey_id = q.survey_id
+        WHERE q.survey_id=?
+        GROUP BY q.id, r.answer, CASE WHEN q.qtype NOT IN ('mcq', 'rating') THEN r.id END
+        ORDER BY q.id, c DESC, r.submitted_at DESC
+    """, get_read_conn(), params=(survey_id,))
+
+@st.cache_data(max_entries=10)
+def responses_csv(survey_id: int, n_rows: int, last_id: int, _rdf):
+    # Encodes the responses already loaded for the table (no second query). _rdf is not hashed;
+    # n_rows and last_id are taken from it, so the key always matches the exported rows.
+    # Older keys are never hit again once responses are added, so keep only the most recent exports.
+    # pandas writes the rows in chunks straight into UTF-8 bytes (no full str copy).
+    buf = io.BytesIO()
+    _rdf.to_csv(buf, index=False, encoding="utf-8", chunksize=10_000)
+    return buf.getvalue()
 
 # ---------------------------
 # Streamlit app
@@ -160,26 +246,29 @@ with st.sidebar:
 if st.session_state.role == "User":
     st.subheader("👤 User: Submit Feedback / Survey")
 
-    surveys_df = fetch_surveys()
-    if surveys_df.empty:
+    surveys = fetch_surveys()
+    if not surveys:
         st.info("No surveys available yet. Please ask admin to create one.")
     else:
-        survey_titles = surveys_df["title"].tolist()
+        survey_titles = [s["title"] for s in surveys]
+        # Reversed so a duplicated title maps to its newest survey (first row in the list)
+        title_to_id = {s["title"]: s["id"] for s in reversed(surveys)}
+        id_to_desc = {s["id"]: s["description"] for s in surveys}
         chosen_title = st.selectbox("Select a Survey", survey_titles)
-        chosen_id = int(surveys_df.loc[surveys_df["title"] == chosen_title, "id"].iloc[0])
+        chosen_id = title_to_id[chosen_title]
 
-        st.write("**Description:**", surveys_df.loc[surveys_df["id"] == chosen_id, "description"].iloc[0])
+        st.write("**Description:**", id_to_desc[chosen_id])
 
-        qdf = fetch_questions(chosen_id)
-        if qdf.empty:
+        questions = fetch_questions(chosen_id)
+        if not questions:
             st.warning("This survey has no questions yet.")
         else:
             respondent = st.text_input("Your Name (optional)", "")
 
             with st.form("survey_form"):
                 answers = {}
-                for _, q in qdf.iterrows():
-                    qid = int(q["id"])
+                for q in questions:
+                    qid = q["id"]
                     qtext = q["question_text"]
                     qtype = q["qtype"]
                     options = (q["options"] or "").strip()
@@ -204,12 +293,10 @@ if st.session_state.role == "User":
 
             if submitted:
                 # Basic validation: ensure no empty answers for text
-                empty_text = [qid for qid, ans in answers.items() if (ans is None or str(ans).strip() == "")]
-                if empty_text:
+                if any(ans is None or str(ans).strip() == "" for ans in answers.values()):
                     st.error("Please answer all questions before submitting.")
                 else:
-                    for qid, ans in answers.items():
-                        insert_response(chosen_id, qid, respondent.strip(), ans)
+                    insert_responses(chosen_id, respondent.strip(), answers.items())
                     st.success("Thank you! Your responses have been submitted.")
 
 # ---------------------------
@@ -261,20 +348,24 @@ else:
                 if not title.strip():
                     st.error("Survey title is required.")
                 else:
-                    sid = insert_survey(title.strip(), desc.strip())
-                    for q_text, q_type, q_opts in question_data:
-                        if q_text.strip():
-                            insert_question(sid, q_text.strip(), q_type, q_opts.strip())
+                    questions = [
+                        (q_text.strip(), q_type, q_opts.strip())
+                        for q_text, q_type, q_opts in question_data
+                        if q_text.strip()
+                    ]
+                    sid = insert_survey(title.strip(), desc.strip(), questions)
                     st.success(f"Survey created successfully! (Survey ID: {sid})")
 
         # ---- View Responses
         with tab2:
-            surveys_df = fetch_surveys()
-            if surveys_df.empty:
+            surveys = fetch_surveys()
+            if not surveys:
                 st.info("No surveys available.")
             else:
-                chosen = st.selectbox("Select Survey", surveys_df["title"].tolist(), key="admin_view_survey")
-                sid = int(surveys_df.loc[surveys_df["title"] == chosen, "id"].iloc[0])
+                survey_titles = [s["title"] for s in surveys]
+                title_to_id = {s["title"]: s["id"] for s in reversed(surveys)}
+                chosen = st.selectbox("Select Survey", survey_titles, key="admin_view_survey")
+                sid = title_to_id[chosen]
 
                 rdf = fetch_responses(sid)
                 st.write("### Responses")
@@ -282,47 +373,48 @@ else:
                     st.warning("No responses yet for this survey.")
                 else:
                     st.dataframe(rdf, use_container_width=True)
-                    csv = rdf.to_csv(index=False).encode("utf-8")
-                    st.download_button("⬇️ Download CSV", csv, file_name=f"survey_{sid}_responses.csv", mime="text/csv")
+                    csv_bytes = responses_csv(sid, len(rdf), int(rdf["id"].max()), rdf)
+                    st.download_button("⬇️ Download CSV", csv_bytes, file_name=f"survey_{sid}_responses.csv", mime="text/csv")
 
         # ---- Analytics
         with tab3:
-            surveys_df = fetch_surveys()
-            if surveys_df.empty:
+            surveys = fetch_surveys()
+            if not surveys:
                 st.info("No surveys available.")
             else:
-                chosen = st.selectbox("Select Survey for Analytics", surveys_df["title"].tolist(), key="admin_ana_survey")
-                sid = int(surveys_df.loc[surveys_df["title"] == chosen, "id"].iloc[0])
+                survey_titles = [s["title"] for s in surveys]
+                title_to_id = {s["title"]: s["id"] for s in reversed(surveys)}
+                chosen = st.selectbox("Select Survey for Analytics", survey_titles, key="admin_ana_survey")
+                sid = title_to_id[chosen]
 
-                qdf = fetch_questions(sid)
-                rdf = fetch_responses(sid)
+                adf = fetch_survey_analytics(sid)
+                total_answers = int(adf["c"].sum())
 
-                if rdf.empty:
+                if total_answers == 0:
                     st.warning("No responses yet to analyze.")
                 else:
                     st.write("### Summary")
-                    st.metric("Total Responses (answers)", len(rdf))
-                    st.metric("Total Questions", len(qdf))
+                    st.metric("Total Responses (answers)", total_answers)
+                    st.metric("Total Questions", adf["question_id"].nunique())
 
                     st.write("### Question-wise Analysis")
-                    for _, q in qdf.iterrows():
-                        qid = int(q["id"])
-                        qtext = q["question_text"]
-                        qtype = q["qtype"]
-
-                        sub = rdf[rdf["question_text"] == qtext]
+                    for (qid, qtext, qtype), sub in adf.groupby(["question_id", "question_text", "qtype"], sort=False):
+                        sub = sub[sub["c"] > 0]
+                        counts = sub.set_index("answer")["c"].rename("count")
 
                         st.markdown(f"**{qtext}** ({qtype})")
                         if qtype == "rating":
-                            # rating average
-                            sub_num = pd.to_numeric(sub["answer"], errors="coerce").dropna()
-                            if len(sub_num) > 0:
-                                st.write(f"Average Rating: **{sub_num.mean():.2f} / 5**")
-                                st.bar_chart(sub_num.value_counts().sort_index())
+                            # rating average, weighted by the per-value counts
+                            counts.index = pd.to_numeric(counts.index, errors="coerce")
+                            counts = counts[counts.index.notna()].groupby(level=0).sum()
+                            if len(counts) > 0:
+                                avg = (counts * counts.index).sum() / counts.sum()
+                                st.write(f"Average Rating: **{avg:.2f} / 5**")
+                                st.bar_chart(counts.sort_index())
                             else:
                                 st.write("No valid ratings yet.")
                         elif qtype == "mcq":
-                            st.bar_chart(sub["answer"].value_counts())
+                            st.bar_chart(counts)
                         else:
                             # text answers
                             st.dataframe(sub[["respondent_name", "answer", "submitted_at"]], use_container_width=True)